@@ -1,9 +1,12 @@
 import boto3
 from botocore.exceptions import ClientError
+import base64
+import functools
 import logging
 import time
 import os
 import json
+import random
 
 # Try to import PyJWT correctly - handle case where 'jwt' package conflicts
 try:
@@ -21,59 +24,99 @@ try:
             jwt = JWTHelper()
         except ImportError:
             # Last resort: use base64 to decode token payload (less reliable but works)
-            import base64
             jwt = None
 except ImportError:
     jwt = None
-    import base64
+
+# Prefer orjson for the token cache and payload parsing; fall back to stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_loads(data):
+    """
+    Parse JSON from str or bytes, using orjson when installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj, indent=False):
+    """
+    Serialize obj as UTF-8 JSON bytes, using orjson when installed.
+    Non-ASCII characters are written as-is rather than escaped.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
 
 logger = logging.getLogger(__name__)
 
 TOKEN_CACHE_FILE = '.token_cache'
 
+_COGNITO = None
+
+def _cognito():
+    """
+    Return a shared Cognito IdP client, creating it on first use.
+    Building a boto3 client reloads service models, so reuse one per process.
+    """
+    global _COGNITO
+    if _COGNITO is None:
+        _COGNITO = boto3.client('cognito-idp', region_name='us-east-1')
+    return _COGNITO
+
+# Maps the base64url alphabet onto standard base64 for str.translate
+_B64URL_TO_STD = str.maketrans('-_', '+/')
+
+def _manual_b64_decode(token, **kwargs):
+    """
+    Decode the JWT payload with base64 only (no signature verification).
+    Accepts and ignores PyJWT-style keyword arguments.
+    """
+    # JWT format: header.payload.signature - slice out the payload without
+    # scanning or copying the signature
+    i = token.find('.')
+    j = token.find('.', i + 1)
+    if i < 0 or j < 0:
+        return None
+    payload = token[i + 1:j]
+    # Add padding if needed
+    payload += '=' * (4 - len(payload) % 4)
+    decoded_bytes = base64.b64decode(payload.translate(_B64URL_TO_STD))
+    return _json_loads(decoded_bytes)
+
+# Resolve the decode strategy once instead of probing PyJWT on every call
+_DECODER = jwt.decode if (jwt and hasattr(jwt, 'decode')) else _manual_b64_decode
+
+@functools.lru_cache(maxsize=32)
 def _decode_token_safe(token):
     """
     Safely decode JWT token to get expiration time.
     Handles different JWT library implementations.
+    Results are memoized per token string; treat the returned dict as read-only.
     """
     if not token:
         return None
-    
-    try:
-        # Try PyJWT decode first
-        if jwt and hasattr(jwt, 'decode'):
-            decoded = jwt.decode(token, options={"verify_signature": False})
-            return decoded
-    except Exception as e:
-        logger.debug(f"PyJWT decode failed: {e}")
-    
-    # Fallback: manually decode JWT payload (base64)
     try:
-        import base64
-        # JWT format: header.payload.signature
-        parts = token.split('.')
-        if len(parts) >= 2:
-            # Decode payload (second part)
-            payload = parts[1]
-            # Add padding if needed
-            payload += '=' * (4 - len(payload) % 4)
-            decoded_bytes = base64.urlsafe_b64decode(payload)
-            decoded = json.loads(decoded_bytes.decode('utf-8'))
-            return decoded
+        return _DECODER(token, options={"verify_signature": False})
     except Exception as e:
-        logger.debug(f"Manual decode failed: {e}")
-    
+        logger.debug(f"Token decode failed: {e}")
     return None
 
 def load_cached_token():
     """
     Load cached tokens from file.
-    Returns tuple: (id_token, refresh_token, access_token) or (None, None, None)
+    Returns tuple: (id_token, refresh_token, access_token, decoded_id_token)
+    or (None, None, None, None)
     """
     try:
         if os.path.exists(TOKEN_CACHE_FILE):
-            with open(TOKEN_CACHE_FILE, 'r') as f:
-                cache = json.load(f)
+            with open(TOKEN_CACHE_FILE, 'rb') as f:
+                cache = _json_loads(f.read())
                 token = cache.get('token')  # Backward compatibility
                 refresh_token = cache.get('refresh_token')
                 access_token = cache.get('access_token')
@@ -86,18 +129,18 @@ def load_cached_token():
                         # Add 5 minute buffer to avoid edge cases
                         if exp > (current_time + 300):  # 5 minutes buffer
                             logger.info(f"✅ Using cached token (expires in {int((exp - current_time) / 60)} minutes)")
-                            return token, refresh_token, access_token
+                            return token, refresh_token, access_token, decoded
                         else:
                             logger.info(f"⚠️  Cached token expired or expiring soon (expires in {int((exp - current_time) / 60)} minutes)")
                             # Return tokens anyway - caller will handle refresh
-                            return token, refresh_token, access_token
+                            return token, refresh_token, access_token, decoded
                     else:
                         logger.warning("⚠️  Could not decode cached token, will re-authenticate")
                 else:
-                    return None, None, None
+                    return None, None, None, None
     except Exception as e:
         logger.error(f"Error loading cached token: {e}")
-    return None, None, None
+    return None, None, None, None
 
 def save_token_to_cache(id_token, refresh_token=None, access_token=None):
     """
@@ -116,8 +159,12 @@ def save_token_to_cache(id_token, refresh_token=None, access_token=None):
         if access_token:
             cache_data['access_token'] = access_token
             
-        with open(TOKEN_CACHE_FILE, 'w') as f:
-            json.dump(cache_data, f)
+        # Write to a temp file and swap it in atomically so a crash mid-write
+        # cannot leave a truncated cache behind
+        tmp_file = TOKEN_CACHE_FILE + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(_json_dumps(cache_data))
+        os.replace(tmp_file, TOKEN_CACHE_FILE)
         logger.debug("✅ Tokens saved to cache")
     except Exception as e:
         logger.error(f"Error saving token to cache: {e}")
@@ -134,7 +181,7 @@ def refresh_token(refresh_token_value, debugger=None):
         Tuple (id_token, refresh_token, access_token) or (None, None, None) if failed
     """
     try:
-        client = boto3.client('cognito-idp', region_name='us-east-1')
+        client = _cognito()
         response = client.initiate_auth(
             AuthFlow='REFRESH_TOKEN_AUTH',
             AuthParameters={
@@ -176,17 +223,18 @@ def handle_auth_flow(username, password, debugger=None):
     max_attempts = 3
     
     # First try to use cached token
-    cached_id_token, cached_refresh_token, cached_access_token = load_cached_token()
+    cached_id_token, cached_refresh_token, cached_access_token, decoded = load_cached_token()
     if cached_id_token:
-        # Check if token is expiring soon and refresh if needed
-        decoded = _decode_token_safe(cached_id_token)
+        # Check if token is expiring soon and refresh if needed (reuses the decoded cache payload)
         if decoded:
             exp = decoded.get('exp', 0)
             current_time = time.time()
             time_until_exp = exp - current_time
             
-            # If token expires in less than 15 minutes, try to refresh
-            if time_until_exp < 900 and cached_refresh_token:  # 15 minutes
+            # If token expires in less than ~15 minutes, try to refresh. The threshold is
+            # jittered by +/- 2 minutes so scheduled runs don't all hit Cognito at once
+            refresh_threshold = 900 + random.uniform(-120, 120)
+            if time_until_exp < refresh_threshold and cached_refresh_token:
                 logger.info(f"🔄 Token expiring in {int(time_until_exp / 60)} minutes - attempting auto-refresh...")
                 new_id_token, new_refresh_token, new_access_token = refresh_token(cached_refresh_token, debugger)
                 
@@ -213,7 +261,7 @@ def handle_auth_flow(username, password, debugger=None):
             # Fall through to re-authentication
     
     try:
-        client = boto3.client('cognito-idp', region_name='us-east-1')
+        client = _cognito()
         response = client.initiate_auth(
             AuthFlow='USER_PASSWORD_AUTH',
             AuthParameters={
@@ -10,12 +10,17 @@ Flow:
 - Save each response with metadata into the output folder.
 """
 import csv
+import io
 import json
 import os
+import string
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-from typing import Iterable, List, Optional
+from typing import Iterable, List, Optional, Tuple
 
 try:
     from dotenv import load_dotenv
@@ -23,12 +28,33 @@ try:
 except Exception:
     pass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 
 API_ROOT = "https://api.ecosuite.io"
 # Allowed rollup granularities enforced by the API.
 ALLOWED_AGGREGATIONS = {"year", "month", "day", "hour", "15minute", "5minute"}
+# Field names that may carry the project name/code, in order of preference.
+PROJECT_NAME_KEYS = ("name", "projectName", "project_name")
+PROJECT_CODE_KEYS = ("code", "projectCode", "project_code")
+# Host pools cached by the shared session, connections kept per host, and
+# number of concurrent requests.
+POOL_CONNECTIONS = 10
+POOL_SIZE = 50
+MAX_WORKERS = 16
+# Number of projects processed at once; each feeds the shared request pool.
+PROJECT_WORKERS = 8
+# Bytes per read when streaming response bodies to disk.
+STREAM_CHUNK_SIZE = 65536
+# Serializes status lines printed from worker threads.
+PRINT_LOCK = threading.Lock()
 
 
 def adjust_end_date(end_date: str) -> str:
@@ -82,42 +108,41 @@ def read_project_ids_from_csv(path: str) -> List[str]:
     }
     project_ids: List[str] = []
     try:
+        # Read once and parse from memory; the sniffer only needs the first 2KB.
         with open(path, newline="", encoding="utf-8") as f:
-            sniffer = csv.Sniffer()
-            sample = f.read(2048)
-            f.seek(0)
-            has_header = sniffer.has_header(sample)
-
-            if has_header:
-                # If a header exists, find a matching column name or fallback to first non-empty cell.
-                reader = csv.DictReader(f)
-                fieldnames = [fn.strip().lower() for fn in (reader.fieldnames or [])]
-                key = None
-                for fn in fieldnames:
-                    if fn in candidates:
-                        key = fn
-                        break
-                for row in reader:
-                    if key:
-                        val = (row.get(key) or "").strip()
-                    else:
-                        val = ""
-                        for v in row.values():
-                            v = (v or "").strip()
-                            if v:
-                                val = v
-                                break
-                    if val:
-                        project_ids.append(val)
-            else:
-                # Headerless CSVs are treated as a single column of IDs.
-                reader = csv.reader(f)
-                for row in reader:
-                    if not row:
-                        continue
-                    val = (row[0] or "").strip()
-                    if val:
-                        project_ids.append(val)
+            data = f.read()
+        has_header = csv.Sniffer().has_header(data[:2048])
+
+        if has_header:
+            # If a header exists, find a matching column name or fallback to first non-empty cell.
+            reader = csv.DictReader(io.StringIO(data))
+            fieldnames = [fn.strip().lower() for fn in (reader.fieldnames or [])]
+            key = None
+            for fn in fieldnames:
+                if fn in candidates:
+                    key = fn
+                    break
+            for row in reader:
+                if key:
+                    val = (row.get(key) or "").strip()
+                else:
+                    val = ""
+                    for v in row.values():
+                        v = (v or "").strip()
+                        if v:
+                            val = v
+                            break
+                if val:
+                    project_ids.append(val)
+        else:
+            # Headerless CSVs are treated as a single column of IDs.
+            reader = csv.reader(io.StringIO(data))
+            for row in reader:
+                if not row:
+                    continue
+                val = (row[0] or "").strip()
+                if val:
+                    project_ids.append(val)
     except Exception as exc:
         print(f"Failed to read CSV: {exc}")
         return []
@@ -151,29 +176,41 @@ def get_api_token() -> str:
     return input("Enter API token (Bearer): ").strip()
 
 
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """Serialize obj as UTF-8 JSON bytes (non-ASCII unescaped), using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _SanitizeTable(dict):
+    """str.translate table that keeps alphanumerics and "-_." and maps the rest to "_"."""
+
+    def __missing__(self, codepoint: int) -> int:
+        ch = chr(codepoint)
+        # Memoize the decision so each distinct character is classified once.
+        self[codepoint] = codepoint if ch.isalnum() or ch in ("-", "_", ".") else ord("_")
+        return self[codepoint]
+
+
+_SANITIZE_TBL = _SanitizeTable(
+    (ord(ch), ord(ch)) for ch in string.ascii_letters + string.digits + "-_."
+)
+
+
 def sanitize_filename(value: str) -> str:
     """Make a filename-safe string for output file and folder names."""
-    cleaned = []
-    for ch in value:
-        if ch.isalnum() or ch in ("-", "_", "."):
-            cleaned.append(ch)
-        else:
-            cleaned.append("_")
-    return "".join(cleaned) or "response"
+    return value.translate(_SANITIZE_TBL) or "response"
 
 
 def extract_project_meta(payload: dict) -> dict:
     """Extract project name/code from different response shapes."""
     project = payload.get("project") if isinstance(payload.get("project"), dict) else payload
     return {
-        "name": project.get("name")
-        or project.get("projectName")
-        or project.get("project_name")
-        or "",
-        "code": project.get("code")
-        or project.get("projectCode")
-        or project.get("project_code")
-        or "",
+        "name": next((project[k] for k in PROJECT_NAME_KEYS if project.get(k)), ""),
+        "code": next((project[k] for k in PROJECT_CODE_KEYS if project.get(k)), ""),
     }
 
 
@@ -188,6 +225,11 @@ def build_dates_suffix(params: Optional[dict]) -> str:
     return ""
 
 
+def utc_timestamp() -> str:
+    """Return the current UTC time in the compact form used in output filenames."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
 def save_response(
     output_root: Path,
     folder_name: str,
@@ -196,74 +238,254 @@ def save_response(
     url: str,
     params: Optional[dict],
     response: requests.Response,
+    timestamp: str = "",
 ) -> None:
-    """Persist a response with metadata, grouping by project folder."""
+    """Persist a response with metadata, grouping by project folder and run timestamp."""
+    # Callers outside main() may not have a run timestamp; stamp the file now instead.
+    timestamp = timestamp or utc_timestamp()
     project_dir = output_root / sanitize_filename(folder_name or "_global")
     project_dir.mkdir(parents=True, exist_ok=True)
 
-    # Name files by project, endpoint label, date window, and a UTC timestamp.
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # Name files by project, endpoint label, date window, and the run timestamp.
     safe_label = sanitize_filename(label or "response")
     content_type = (response.headers.get("Content-Type") or "").lower()
-    if "application/json" in content_type:
-        ext = "json"
-        try:
-            payload = response.json()
-        except ValueError:
-            payload = {"raw": response.text}
-    else:
-        ext = "txt"
-        payload = {"raw": response.text}
-
-    payload_wrapper = {
-        "meta": {
-            "url": url,
-            "params": params or {},
-            "status_code": response.status_code,
-            "content_type": response.headers.get("Content-Type"),
-            "fetched_at": timestamp,
-        },
-        "data": payload,
+    ext = "json" if "application/json" in content_type else "txt"
+
+    meta = {
+        "url": url,
+        "params": params or {},
+        "status_code": response.status_code,
+        "content_type": response.headers.get("Content-Type"),
+        "fetched_at": timestamp,
     }
 
     safe_code = sanitize_filename(project_code or "project")
     dates_suffix = build_dates_suffix(params)
     filename = f"{safe_code}_{safe_label}{dates_suffix}_{timestamp}.{ext}"
     path = project_dir / filename
-    if ext == "json":
-        with path.open("w", encoding="utf-8") as f:
-            json.dump(payload_wrapper, f, ensure_ascii=True, indent=2)
-    else:
-        with path.open("w", encoding="utf-8") as f:
-            f.write(json.dumps(payload_wrapper, ensure_ascii=True, indent=2))
-            f.write("\n")
+    # Both branches write the meta header directly and splice the body in
+    # after it, instead of building and encoding a full wrapper dict. Write to a
+    # unique temp file so a download that fails midway never leaves a truncated
+    # file and concurrent saves to the same path don't share one temp file.
+    meta_json = _json_dumps(meta, indent=True).replace(b"\n", b"\n  ")
+    fd, tmp_name = tempfile.mkstemp(dir=project_dir, suffix=".tmp")
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(b'{\n  "meta": ' + meta_json + b',\n  "data": ')
+            if ext == "json":
+                # Copy the raw JSON body in chunks; memory stays bounded by the chunk size.
+                # A body with no non-whitespace bytes has no value, so write null.
+                empty = True
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        empty = empty and not chunk.strip()
+                if empty:
+                    f.write(b"null")
+            else:
+                # Only the text itself needs encoding, as an escaped JSON string.
+                f.write(b'{\n    "raw": ' + _json_dumps(response.text) + b"\n  }")
+            f.write(b"\n}\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def create_session(token: str) -> requests.Session:
+    """Build an authorized session with pooled keep-alive connections and retries."""
+    session = requests.Session()
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+    )
+    # Return the final response on exhausted status retries so it still gets saved.
+    retries = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_SIZE, max_retries=retries
+    )
+    session.mount("https://", adapter)
+    return session
 
 
 def api_get(
+    session: requests.Session,
     url: str,
-    headers: dict,
     params: Optional[dict] = None,
     label: str = "",
     output_root: Optional[Path] = None,
     folder_name: str = "",
     project_code: str = "",
+    timestamp: str = "",
 ) -> Optional[requests.Response]:
     """GET a URL, print a short status line, and optionally save the response."""
+    label_prefix = f"[{label}] " if label else ""
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        response = session.get(url, params=params, timeout=30, stream=True)
         status = response.status_code
-        size = len(response.content or b"")
-        label_prefix = f"[{label}] " if label else ""
-        print(f"{label_prefix}{status} {url} ({size} bytes)")
+        # Report the advertised size; reading response.content would buffer the streamed body.
+        size = response.headers.get("Content-Length") or "?"
+        with PRINT_LOCK:
+            print(f"{label_prefix}{status} {url} ({size} bytes)")
         if output_root is not None:
-            save_response(output_root, folder_name, project_code, label, url, params, response)
+            save_response(
+                output_root, folder_name, project_code, label, url, params, response, timestamp
+            )
         return response
     except requests.exceptions.RequestException as exc:
-        label_prefix = f"[{label}] " if label else ""
-        print(f"{label_prefix}ERROR {url}: {exc}")
+        with PRINT_LOCK:
+            print(f"{label_prefix}ERROR {url}: {exc}")
         return None
 
 
+def fetch_project_details(
+    session: requests.Session, project_id: str
+) -> Tuple[str, str, Optional[requests.Response]]:
+    """Fetch project details and return (project_name, project_code, response).
+
+    Name and code fall back to the project ID when the response lacks them.
+    """
+    response = api_get(session, f"{API_ROOT}/projects/{project_id}", label="project_details")
+    project_name = project_id
+    project_code = project_id
+    if response is not None:
+        try:
+            meta = extract_project_meta(response.json() or {})
+            if meta["name"]:
+                project_name = meta["name"]
+            if meta["code"]:
+                project_code = meta["code"]
+        except ValueError:
+            pass
+        except requests.exceptions.RequestException as exc:
+            # The body is streamed, so read errors surface here rather than in api_get.
+            with PRINT_LOCK:
+                print(f"[project_details] ERROR {API_ROOT}/projects/{project_id}: {exc}")
+            response = None
+    return project_name, project_code, response
+
+
+def build_project_tasks(
+    project_id: str,
+    project_name: str,
+    project_code: str,
+    start_date: str,
+    end_date: str,
+    aggregation: str,
+) -> List[tuple]:
+    """Return (url, params, label, folder_name, project_code) tuples for one project."""
+    window = {"start": start_date, "end": end_date}
+    endpoints = [
+        (f"{API_ROOT}/projects/{project_id}/pro-forma", None, "price_data"),
+        (
+            f"{API_ROOT}/energy/datums/projects/{project_id}",
+            {**window, "aggregation": aggregation},
+            "energy_datums",
+        ),
+        (
+            f"{API_ROOT}/energy/readings",
+            {"projectId": project_id, **window},
+            "energy_readings_projectId",
+        ),
+        (
+            f"{API_ROOT}/energy/datums/generation/expected",
+            {**window, "projectIds": project_id, "aggregation": aggregation},
+            "expected_generation_projectIds",
+        ),
+        (
+            f"{API_ROOT}/energy/datums/generation/predicted/projects/{project_id}",
+            {**window, "aggregation": "day"},
+            "forecast_generation",
+        ),
+        (
+            f"{API_ROOT}/weather/datums/projects/{project_id}",
+            {**window, "aggregation": aggregation},
+            "weather_datums",
+        ),
+        (f"{API_ROOT}/solarnetwork/metadata/projects/{project_id}", None, "solarnetwork_metadata"),
+        (f"{API_ROOT}/projects/{project_id}/records", None, "project_records"),
+        (f"{API_ROOT}/projects/{project_id}/record-documents", None, "record_documents"),
+    ]
+    return [(url, params, label, project_name, project_code) for url, params, label in endpoints]
+
+
+def fetch_task(
+    session: requests.Session, task: tuple, output_root: Path, timestamp: str
+) -> Optional[requests.Response]:
+    """Run one (url, params, label, folder_name, project_code) task and save its response."""
+    url, params, label, folder_name, project_code = task
+    return api_get(
+        session,
+        url,
+        params=params,
+        label=label,
+        output_root=output_root,
+        folder_name=folder_name,
+        project_code=project_code,
+        timestamp=timestamp,
+    )
+
+
+def process_project(
+    session: requests.Session,
+    executor: ThreadPoolExecutor,
+    project_id: str,
+    start_date: str,
+    end_date: str,
+    aggregation: str,
+    output_root: Path,
+    timestamp: str,
+) -> None:
+    """Fetch and save project details, then all project endpoints via executor."""
+    # Fetch project metadata first to label output with human-friendly names.
+    project_name, project_code, project_details_resp = fetch_project_details(session, project_id)
+    if project_details_resp is not None:
+        save_response(
+            output_root,
+            project_name,
+            project_code,
+            "project_details",
+            f"{API_ROOT}/projects/{project_id}",
+            None,
+            project_details_resp,
+            timestamp,
+        )
+    tasks = build_project_tasks(
+        project_id, project_name, project_code, start_date, end_date, aggregation
+    )
+    # Responses are saved by the workers; consume the iterator to wait for all of them.
+    list(executor.map(lambda task: fetch_task(session, task, output_root, timestamp), tasks))
+
+
+def build_global_tasks(today_utc: str, aggregation: str) -> List[tuple]:
+    """Return (url, params, label, folder_name, project_code) tuples for global endpoints."""
+    endpoints = [
+        (
+            f"{API_ROOT}/events",
+            {"start": "1970-01-01", "end": adjust_end_date(today_utc), "aggregation": aggregation},
+            "events",
+        ),
+        (f"{API_ROOT}/solarnetwork/nodes", None, "solarnetwork_nodes"),
+        (f"{API_ROOT}/users", None, "users"),
+        (f"{API_ROOT}/user-groups", None, "user_groups"),
+        (f"{API_ROOT}/records", None, "records"),
+        (f"{API_ROOT}/projects", None, "projects"),
+        (f"{API_ROOT}/portfolios", None, "portfolios"),
+        (f"{API_ROOT}/energy/status", None, "energy_status"),
+        (f"{API_ROOT}/energy/instantaneous", None, "energy_instantaneous"),
+        (f"{API_ROOT}/dashboard/status", None, "dashboard_status"),
+    ]
+    return [(url, params, label, "_global", "_global") for url, params, label in endpoints]
+
+
 def main() -> int:
     """Interactive entry point for collecting inputs and calling endpoints."""
     project_ids = prompt_project_ids()
@@ -289,11 +511,8 @@ def main() -> int:
 
     adjusted_end_date = adjust_end_date(end_date)
     today_utc = datetime.now(timezone.utc).date().isoformat()
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
+    # One timestamp per run so every output file from this invocation sorts together.
+    run_ts = utc_timestamp()
 
     # Store output artifacts in a local folder relative to the project root.
     output_root = Path("output")
@@ -301,201 +520,37 @@ def main() -> int:
 
     print("\nCalling APIs...")
 
-    for project_id in project_ids:
-        if not project_id:
-            continue
-
-        # Fetch project metadata to label output with human-friendly names.
-        project_details_resp = api_get(
-            f"{API_ROOT}/projects/{project_id}",
-            headers,
-            label="project_details",
-            output_root=None,
-        )
-        project_name = project_id
-        project_code = project_id
-        project_payload = None
-        if project_details_resp is not None:
-            try:
-                project_payload = project_details_resp.json() or {}
-                meta = extract_project_meta(project_payload)
-                if meta["name"]:
-                    project_name = meta["name"]
-                if meta["code"]:
-                    project_code = meta["code"]
-            except ValueError:
-                pass
-        if project_details_resp is not None and output_root is not None:
-            save_response(
-                output_root,
-                project_name,
-                project_code,
-                "project_details",
-                f"{API_ROOT}/projects/{project_id}",
-                None,
-                project_details_resp,
+    # Fetch each project once; duplicates would race to write the same files.
+    project_ids = list(dict.fromkeys(project_id for project_id in project_ids if project_id))
+    project_workers = min(len(project_ids), PROJECT_WORKERS) or 1
+    with create_session(token) as session, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Global endpoints don't depend on project metadata, so start them right away.
+        global_futures = [
+            executor.submit(fetch_task, session, task, output_root, run_ts)
+            for task in build_global_tasks(today_utc, aggregation)
+        ]
+
+        # Projects are independent; each one resolves its names and then fans its
+        # endpoints out to the shared request pool.
+        with ThreadPoolExecutor(max_workers=project_workers) as project_executor:
+            list(
+                project_executor.map(
+                    lambda project_id: process_project(
+                        session,
+                        executor,
+                        project_id,
+                        start_date,
+                        adjusted_end_date,
+                        aggregation,
+                        output_root,
+                        run_ts,
+                    ),
+                    project_ids,
+                )
             )
-        # Project-specific endpoints.
-        api_get(
-            f"{API_ROOT}/projects/{project_id}/pro-forma",
-            headers,
-            label="price_data",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/energy/datums/projects/{project_id}",
-            headers,
-            params={"start": start_date, "end": adjusted_end_date, "aggregation": aggregation},
-            label="energy_datums",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/energy/readings",
-            headers,
-            params={"projectId": project_id, "start": start_date, "end": adjusted_end_date},
-            label="energy_readings_projectId",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/energy/datums/generation/expected",
-            headers,
-            params={"start": start_date, "end": adjusted_end_date, "projectIds": project_id, "aggregation": aggregation},
-            label="expected_generation_projectIds",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/energy/datums/generation/predicted/projects/{project_id}",
-            headers,
-            params={"start": start_date, "end": adjusted_end_date, "aggregation": "day"},
-            label="forecast_generation",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/weather/datums/projects/{project_id}",
-            headers,
-            params={"start": start_date, "end": adjusted_end_date, "aggregation": aggregation},
-            label="weather_datums",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/solarnetwork/metadata/projects/{project_id}",
-            headers,
-            label="solarnetwork_metadata",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/projects/{project_id}/records",
-            headers,
-            label="project_records",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
-        api_get(
-            f"{API_ROOT}/projects/{project_id}/record-documents",
-            headers,
-            label="record_documents",
-            output_root=output_root,
-            folder_name=project_name,
-            project_code=project_code,
-        )
 
-    # Global endpoints not scoped to a specific project.
-    api_get(
-        f"{API_ROOT}/events",
-        headers,
-        params={"start": "1970-01-01", "end": adjust_end_date(today_utc), "aggregation": aggregation},
-        label="events",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/solarnetwork/nodes",
-        headers,
-        label="solarnetwork_nodes",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/users",
-        headers,
-        label="users",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/user-groups",
-        headers,
-        label="user_groups",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/records",
-        headers,
-        label="records",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/projects",
-        headers,
-        label="projects",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/portfolios",
-        headers,
-        label="portfolios",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/energy/status",
-        headers,
-        label="energy_status",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/energy/instantaneous",
-        headers,
-        label="energy_instantaneous",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
-    api_get(
-        f"{API_ROOT}/dashboard/status",
-        headers,
-        label="dashboard_status",
-        output_root=output_root,
-        folder_name="_global",
-        project_code="_global",
-    )
+        for future in global_futures:
+            future.result()
 
     print("Done.")
     return 0